@@ -0,0 +1,41 @@
+import logging
+
+import anthropic
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+def query_error_to_http(error: Exception) -> HTTPException:
+    """
+    Log a failed query and map it to the HTTPException returned to the client.
+
+    Upstream Anthropic failures get short, fixed details rather than str(error),
+    which embeds the full Anthropic response body; the full error is logged.
+
+    Args:
+        error: Exception raised while answering the query
+
+    Returns:
+        HTTPException with the status code and detail for the client
+    """
+    if isinstance(error, anthropic.APIStatusError):
+        logger.warning(
+            "Anthropic API error %s (status %s, request id %s): %s",
+            type(error).__name__,
+            error.status_code,
+            error.request_id,
+            error,
+        )
+        if isinstance(error, anthropic.RateLimitError):
+            return HTTPException(status_code=429, detail="rate_limited")
+        return HTTPException(status_code=502, detail="upstream_error")
+
+    if isinstance(error, anthropic.APIConnectionError):
+        logger.warning(
+            "Could not reach Anthropic API (%s): %s", type(error).__name__, error
+        )
+        return HTTPException(status_code=502, detail="upstream_unreachable")
+
+    logger.error("Query failed", exc_info=error)
+    return HTTPException(status_code=500, detail="internal_error")
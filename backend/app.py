@@ -4,11 +4,11 @@ from typing import List, Optional
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from api_errors import query_error_to_http
 from config import config
 from rag_system import RAGSystem
 
@@ -16,18 +16,19 @@ from rag_system import RAGSystem
 warnings.filterwarnings("ignore", message="resource_tracker: There appear to be.*")
 
 # Initialize FastAPI app
-app = FastAPI(title="Course Materials RAG System", root_path="")
-
-# Add trusted host middleware for proxy
-app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
+app = FastAPI(
+    title="Course Materials RAG System",
+    root_path="",
+    default_response_class=ORJSONResponse,
+)
 
 # Enable CORS with proper settings for proxy
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
     expose_headers=["*"],
 )
 
@@ -77,7 +78,7 @@ async def query_documents(request: QueryRequest):
             answer=answer, sources=sources, session_id=session_id
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise query_error_to_http(e)
 
 
 @app.get("/api/courses", response_model=CourseStats)
@@ -3,39 +3,101 @@ Simplified version of the RAG app that works without ML dependencies
 This version provides a basic chat interface with Anthropic Claude
 """
 
+import asyncio
+import hashlib
+import mimetypes
 import os
 import warnings
-from typing import Optional
-
-import anthropic
+from collections import OrderedDict, deque
+from functools import partial
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from aiolimiter import AsyncLimiter
+from anthropic import AsyncAnthropic
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from api_errors import query_error_to_http
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
 # Load environment variables
 load_dotenv()
-
-# Initialize FastAPI app
-app = FastAPI(
-    title="Simple RAG Chatbot", description="Basic chat interface with Claude"
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+# Development mode (DEV=1): auto-reload and serve the frontend fresh from disk
+DEV = os.getenv("DEV") == "1"
+
+# Shared HTTP/2 connection pool so bursts reuse keep-alive connections
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=200, max_keepalive_connections=100, keepalive_expiry=60
+    ),
+    timeout=httpx.Timeout(60.0, connect=5.0),
 )
 
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# Initialize Anthropic client (async so concurrent requests don't block the loop)
+anthropic_client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY, http_client=http_client)
+
+# Cap in-flight Claude calls to stay under the account's rate limit
+MAX_CONCURRENT_REQUESTS = 40
+anthropic_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+# Proactively pace Claude calls under the account's per-minute request and
+# token limits (defaults match tier 1) so bursts queue here instead of hitting 429s
+ANTHROPIC_RPM = int(os.getenv("ANTHROPIC_RPM", "40"))
+ANTHROPIC_TPM = int(os.getenv("ANTHROPIC_TPM", "16000"))
+request_limiter = AsyncLimiter(ANTHROPIC_RPM, 60)
+token_limiter = AsyncLimiter(ANTHROPIC_TPM, 60)
+
+MAX_TOKENS = 800
+
+# Short-lived cache of Claude answers keyed by the full conversation sent
+# (history + query). Responses are deterministic (temperature=0), and keying on
+# the whole context keeps multi-turn answers correct. Completed answers are
+# reused for identical contexts, which in practice means identical first turns
+# across sessions: once a session has an answer its history, and so its key,
+# changes. Concurrent identical requests (e.g. a double-submit) share the one
+# in-flight Claude call instead.
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = 60  # seconds
+response_cache: "TTLCache[Tuple[str, ...], str]" = TTLCache(
+    maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL
 )
+pending_responses: "Dict[Tuple[str, ...], asyncio.Task[str]]" = {}
+
+# Static system prompt sent with every query
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. You can answer questions "
+    "about various topics. Since the full RAG system is not yet "
+    "set up, you should use your general knowledge to provide "
+    "helpful responses. Note: The vector search functionality is "
+    "not available yet, so you're responding based on your "
+    "training data."
+)
+
+# System prompt as content blocks, marked cacheable so Anthropic can reuse the prefix
+SYSTEM_BLOCKS = [
+    {"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+]
 
-# Initialize Anthropic client
-anthropic_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+# Fixed response payloads for the Claude-only mode, shared across responses
+# (tuples serialize as JSON arrays)
+DEFAULT_SOURCES = ("General AI Knowledge (RAG system not fully initialized)",)
+PLACEHOLDER_COURSE_TITLES = (
+    "Full RAG system not initialized - install ChromaDB and "
+    "sentence-transformers to enable course search",
+)
 
 
 # Request/Response models
@@ -46,108 +108,283 @@ class QueryRequest(BaseModel):
 
 class QueryResponse(BaseModel):
     answer: str
-    sources: list = []
+    sources: list = Field(default_factory=list)
     session_id: str = "default"
 
 
 class CourseStats(BaseModel):
     total_courses: int = 0
-    course_titles: list = []
-
-
-# Simple session storage (in production, use a database)
-sessions = {}
-
-
-@app.post("/api/query", response_model=QueryResponse)
-async def query_documents(request: QueryRequest):
-    """Process a query and return response"""
-    try:
-        if not os.getenv("ANTHROPIC_API_KEY"):
-            raise HTTPException(
-                status_code=500,
-                detail="Anthropic API key not configured. Please add "
-                "ANTHROPIC_API_KEY to your .env file.",
-            )
-
-        # Create a session ID if not provided
-        session_id = request.session_id or "default"
-
-        # Get conversation history
-        history = sessions.get(session_id, [])
-
-        # Build the prompt with context
-        system_prompt = (
-            "You are a helpful AI assistant. You can answer questions "
-            "about various topics. Since the full RAG system is not yet "
-            "set up, you should use your general knowledge to provide "
-            "helpful responses. Note: The vector search functionality is "
-            "not available yet, so you're responding based on your "
-            "training data."
+    course_titles: list = Field(default_factory=list)
+
+
+# Simple session storage (in production, use a database).
+# Bounded LRU: least recently used sessions are evicted past MAX_SESSIONS, and
+# each session keeps its recent turns as ready-to-send Claude message dicts.
+# Reads and updates never await, so they are atomic on the event loop and
+# need no lock.
+MAX_SESSIONS = 10_000
+MAX_HISTORY_EXCHANGES = 3
+MAX_HISTORY_MESSAGES = MAX_HISTORY_EXCHANGES * 2  # user + assistant per exchange
+sessions: "OrderedDict[str, Deque[dict]]" = OrderedDict()
+
+
+async def ask_claude(query: str, session_id: str) -> str:
+    """Answer a query with Claude, using and updating the session's history"""
+    if not ANTHROPIC_API_KEY:
+        raise HTTPException(
+            status_code=500,
+            detail="Anthropic API key not configured. Please add "
+            "ANTHROPIC_API_KEY to your .env file.",
         )
 
-        # Build conversation context
-        messages = []
-        for exchange in history[-3:]:  # Keep last 3 exchanges
-            messages.append({"role": "user", "content": exchange["user"]})
-            messages.append({"role": "assistant", "content": exchange["assistant"]})
-
-        # Add current query
-        messages.append({"role": "user", "content": request.query})
-
-        # Call Claude
-        response = anthropic_client.messages.create(
+    # Build conversation context from history plus the current query
+    history = sessions.get(session_id)
+    if history is not None:
+        sessions.move_to_end(session_id)
+    messages = list(history or ())
+    messages.append({"role": "user", "content": query})
+
+    cache_key = tuple(message["content"] for message in messages)
+    answer = response_cache.get(cache_key)
+    if answer is None:
+        # Shielded so one caller's disconnect doesn't cancel the shared call
+        answer = await asyncio.shield(_claude_task(cache_key, messages))
+
+    # Store in session
+    history = sessions.get(session_id)
+    if history is None:
+        history = sessions[session_id] = deque(maxlen=MAX_HISTORY_MESSAGES)
+        if len(sessions) > MAX_SESSIONS:
+            sessions.popitem(last=False)
+    else:
+        sessions.move_to_end(session_id)
+    history.append(messages[-1])
+    history.append({"role": "assistant", "content": answer})
+
+    return answer
+
+
+def _claude_task(
+    cache_key: Tuple[str, ...], messages: List[dict]
+) -> "asyncio.Task[str]":
+    """Return the in-flight Claude call for cache_key, starting one if needed"""
+    task = pending_responses.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_call_claude(messages))
+        pending_responses[cache_key] = task
+        task.add_done_callback(partial(_finish_claude_task, cache_key))
+    return task
+
+
+def _finish_claude_task(cache_key: Tuple[str, ...], task: "asyncio.Task[str]") -> None:
+    """Move a finished Claude call from pending_responses into response_cache"""
+    del pending_responses[cache_key]
+    # task.exception() also marks a failure as retrieved if every caller left
+    if not task.cancelled() and task.exception() is None:
+        response_cache[cache_key] = task.result()
+
+
+async def _call_claude(messages: List[dict]) -> str:
+    """Send messages to Claude under the rate limiters and return the answer"""
+    # Rough token estimate (~4 characters per token) plus the completion budget
+    approx_tokens = (
+        sum(len(message["content"]) for message in messages) + len(SYSTEM_PROMPT)
+    ) // 4 + MAX_TOKENS
+
+    # Call Claude
+    async with request_limiter, anthropic_semaphore:
+        await token_limiter.acquire(min(approx_tokens, ANTHROPIC_TPM))
+        response = await anthropic_client.messages.create(
             model="claude-3-sonnet-20240229",
-            max_tokens=800,
+            max_tokens=MAX_TOKENS,
             temperature=0,
-            system=system_prompt,
+            system=SYSTEM_BLOCKS,
             messages=messages,
         )
 
-        answer = response.content[0].text
-
-        # Store in session
-        if session_id not in sessions:
-            sessions[session_id] = []
-        sessions[session_id].append({"user": request.query, "assistant": answer})
-
-        return QueryResponse(
-            answer=answer,
-            sources=["General AI Knowledge (RAG system not fully initialized)"],
-            session_id=session_id,
+    return response.content[0].text
+
+
+# Serve static files for the frontend.
+# The frontend is small, so it is read into memory once at startup instead of
+# stat()ing and opening files on the event loop for every request. In DEV mode
+# it is served from disk with no-cache headers so edits show up on reload.
+FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+
+def _load_static_files(directory: Path) -> Dict[str, Tuple[bytes, str, str]]:
+    """Map each file's relative URL path to (content, media type, ETag)"""
+    if not directory.is_dir():
+        raise RuntimeError(f"Directory '{directory}' does not exist")
+
+    files = {}
+    for file_path in directory.rglob("*"):
+        if not file_path.is_file():
+            continue
+        content = file_path.read_bytes()
+        media_type = mimetypes.guess_type(file_path.name)[0]
+        etag = '"' + hashlib.md5(content, usedforsecurity=False).hexdigest() + '"'
+        files[file_path.relative_to(directory).as_posix()] = (
+            content,
+            media_type or "application/octet-stream",
+            etag,
         )
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.get("/api/courses", response_model=CourseStats)
-async def get_course_stats():
-    """Get course statistics (placeholder)"""
-    return CourseStats(
-        total_courses=0,
-        course_titles=[
-            "Full RAG system not initialized - install ChromaDB and "
-            "sentence-transformers to enable course search"
-        ],
+    return files
+
+
+class DevStaticFiles(StaticFiles):
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if isinstance(response, FileResponse):
+            # Add no-cache headers for development
+            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+            response.headers["Pragma"] = "no-cache"
+            response.headers["Expires"] = "0"
+        return response
+
+
+def create_app(rag: Optional[Any] = None, mount_static: bool = True) -> FastAPI:
+    """Build the chatbot API.
+
+    Args:
+        rag: Optional RAG system (``RAGSystem`` or compatible object). When
+            given, queries and course stats are served from it; otherwise
+            queries go straight to Claude.
+        mount_static: Whether to serve the frontend from ``FRONTEND_DIR``.
+            In DEV mode files are read from disk on every request and sent
+            with no-cache headers; otherwise they are cached in memory.
+
+    Returns:
+        Configured FastAPI application
+    """
+    app = FastAPI(
+        title="Simple RAG Chatbot",
+        description="Basic chat interface with Claude",
+        default_response_class=ORJSONResponse,
+    )
+    app.state.rag = rag
+
+    # Enable CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST"],
+        allow_headers=["content-type"],
     )
 
+    # Endpoints build their response dicts directly; response_model=None skips
+    # FastAPI's re-validation pass while `responses` keeps the OpenAPI schema.
+    @app.post(
+        "/api/query",
+        response_model=None,
+        responses={200: {"model": QueryResponse}},
+    )
+    async def query_documents(request: QueryRequest):
+        """Process a query and return response"""
+        try:
+            if rag is not None:
+                session_id = request.session_id or rag.session_manager.create_session()
+                answer, sources = rag.query(request.query, session_id)
+                return {"answer": answer, "sources": sources, "session_id": session_id}
+
+            # Create a session ID if not provided
+            session_id = request.session_id or "default"
+            answer = await ask_claude(request.query, session_id)
+
+            return {
+                "answer": answer,
+                "sources": DEFAULT_SOURCES,
+                "session_id": session_id,
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise query_error_to_http(e)
+
+    @app.get(
+        "/api/courses",
+        response_model=None,
+        responses={200: {"model": CourseStats}},
+    )
+    async def get_course_stats():
+        """Get course statistics (placeholder without a RAG system)"""
+        if rag is None:
+            return {
+                "total_courses": 0,
+                "course_titles": PLACEHOLDER_COURSE_TITLES,
+            }
+        try:
+            analytics = rag.get_course_analytics()
+            return {
+                "total_courses": analytics["total_courses"],
+                "course_titles": analytics["course_titles"],
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/health")
+    async def health_check():
+        """Health check endpoint"""
+        return {
+            "status": "healthy",
+            "anthropic_api_configured": bool(ANTHROPIC_API_KEY),
+            "mode": "simplified" if rag is None else "rag",
+        }
+
+    if mount_static and DEV:
+        app.mount("/", DevStaticFiles(directory=FRONTEND_DIR, html=True), name="static")
+    elif mount_static:
+        static_files = _load_static_files(FRONTEND_DIR)
+
+        @app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+        async def serve_frontend(path: str, request: Request):
+            """Serve frontend assets from memory, with index.html for directories"""
+            if not path or path.endswith("/"):
+                path += "index.html"
+            static_file = static_files.get(path)
+            if static_file is None:
+                raise HTTPException(status_code=404, detail="Not Found")
+
+            content, media_type, etag = static_file
+            headers = {"ETag": etag, "Cache-Control": STATIC_CACHE_CONTROL}
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers=headers)
+            return Response(content=content, media_type=media_type, headers=headers)
+
+    return app
+
+
+app = create_app()
+
+
+# The shared HTTP client belongs to the module-level app, so only that app
+# closes it; apps built separately with create_app() (e.g. in tests) must not.
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled connections to the Anthropic API"""
+    await http_client.aclose()
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    api_key_configured = bool(os.getenv("ANTHROPIC_API_KEY"))
-    return {
-        "status": "healthy",
-        "anthropic_api_configured": api_key_configured,
-        "mode": "simplified",
-    }
-
-
-# Serve static files for the frontend
-app.mount("/", StaticFiles(directory="../frontend", html=True), name="static")
 
 if __name__ == "__main__":
+    import sys
+
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    # Auto-reload only in development (DEV=1); reload needs the app as an import
+    # string. Runs a single worker: sessions, the response cache and the
+    # Anthropic rate limiters are in-process state that workers would not share.
+    reload = DEV
+
+    # uvloop is not available on Windows; uvicorn's default loop is used there
+    uvicorn.run(
+        "simple_app:app" if reload else app,
+        host="0.0.0.0",
+        port=8000,
+        reload=reload,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        log_level="warning",
+    )
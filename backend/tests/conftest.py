@@ -1,7 +1,9 @@
+import httpx
 import pytest
 import tempfile
 import os
-from unittest.mock import Mock, patch
+from collections import OrderedDict
+from unittest.mock import AsyncMock, Mock, patch
 from fastapi.testclient import TestClient
 from pathlib import Path
 
@@ -182,42 +184,15 @@ def mock_rag_system(test_config, mock_vector_store, mock_ai_generator, mock_sess
         yield mock_instance
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_app_without_static():
-    """Create test FastAPI app without static file mounting to avoid import issues"""
-    from fastapi import FastAPI, HTTPException
-    from fastapi.middleware.cors import CORSMiddleware
-    from fastapi.middleware.trustedhost import TrustedHostMiddleware
-    from pydantic import BaseModel
-    from typing import List, Optional
-    
-    # Create separate test app
-    app = FastAPI(title="Test Course Materials RAG System")
-    
-    # Add middleware
-    app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-        expose_headers=["*"],
-    )
-    
-    # Define models inline to avoid import issues
-    class QueryRequest(BaseModel):
-        query: str
-        session_id: Optional[str] = None
-    
-    class QueryResponse(BaseModel):
-        answer: str
-        sources: List[str]
-        session_id: str
-    
-    class CourseStats(BaseModel):
-        total_courses: int
-        course_titles: List[str]
+    """Create test FastAPI app without static file mounting to avoid import issues
+
+    Built once per test session from ``simple_app.create_app``; the mocked RAG
+    system is exposed as ``app.state.rag`` and reset between API tests by
+    ``reset_mock_rag`` in ``test_api_endpoints.py``.
+    """
+    from simple_app import create_app
     
     # Mock RAG system for testing
     mock_rag = Mock()
@@ -231,34 +206,7 @@ def test_app_without_static():
     }
     mock_rag.session_manager.create_session.return_value = "test-session-123"
     
-    # Define endpoints inline
-    @app.post("/api/query", response_model=QueryResponse)
-    async def query_documents(request: QueryRequest):
-        try:
-            session_id = request.session_id
-            if not session_id:
-                session_id = mock_rag.session_manager.create_session()
-            
-            answer, sources = mock_rag.query(request.query, session_id)
-            
-            return QueryResponse(
-                answer=answer,
-                sources=sources,
-                session_id=session_id
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-    
-    @app.get("/api/courses", response_model=CourseStats)
-    async def get_course_stats():
-        try:
-            analytics = mock_rag.get_course_analytics()
-            return CourseStats(
-                total_courses=analytics["total_courses"],
-                course_titles=analytics["course_titles"]
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    app = create_app(rag=mock_rag, mount_static=False)
     
     @app.get("/")
     async def root():
@@ -267,12 +215,81 @@ def test_app_without_static():
     return app
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_client(test_app_without_static):
     """Create test client for API testing"""
     return TestClient(test_app_without_static)
 
 
+@pytest.fixture
+async def async_test_client(test_app_without_static):
+    """Create async HTTP client for issuing concurrent API requests"""
+    transport = httpx.ASGITransport(app=test_app_without_static)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def mock_claude_create(monkeypatch):
+    """Mock simple_app's Claude call and reset its session and cache state
+
+    Each answer echoes the last user message, e.g. "Answer to: What is Python?".
+    """
+    import simple_app
+    from aiolimiter import AsyncLimiter
+    
+    async def create(**kwargs):
+        response = Mock()
+        query = kwargs["messages"][-1]["content"]
+        response.content = [Mock(text=f"Answer to: {query}")]
+        return response
+    
+    mock_create = AsyncMock(side_effect=create)
+    monkeypatch.setattr(simple_app.anthropic_client.messages, "create", mock_create)
+    monkeypatch.setattr(simple_app, "ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setattr(simple_app, "sessions", OrderedDict())
+    monkeypatch.setattr(simple_app, "request_limiter", AsyncLimiter(1000, 60))
+    monkeypatch.setattr(simple_app, "token_limiter", AsyncLimiter(10**6, 60))
+    monkeypatch.setattr(simple_app, "pending_responses", {})
+    simple_app.response_cache.clear()
+    
+    yield mock_create
+    
+    simple_app.response_cache.clear()
+
+
+@pytest.fixture
+def claude_test_client(mock_claude_create):
+    """Create test client for simple_app in Claude-only mode (no RAG system)
+
+    Used as a context manager so all requests share one event loop, as the
+    rate limiters expect.
+    """
+    from simple_app import create_app
+    
+    with TestClient(create_app(mount_static=False)) as client:
+        yield client
+
+
+@pytest.fixture
+def frontend_dir(temp_dir):
+    """Create a small frontend tree with a nested asset"""
+    frontend = Path(temp_dir) / "frontend"
+    (frontend / "assets").mkdir(parents=True)
+    (frontend / "index.html").write_text("<html><body>Course Materials</body></html>")
+    (frontend / "assets" / "app.js").write_text("console.log('ready');")
+    return frontend
+
+
+@pytest.fixture
+def static_test_client(frontend_dir, monkeypatch):
+    """Create test client for an app serving the frontend from frontend_dir"""
+    import simple_app
+    
+    monkeypatch.setattr(simple_app, "FRONTEND_DIR", frontend_dir)
+    return TestClient(simple_app.create_app(rag=Mock()))
+
+
 @pytest.fixture
 def sample_query_request():
     """Sample query request for testing"""
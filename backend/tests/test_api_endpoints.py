@@ -1,6 +1,18 @@
+import anthropic
+import asyncio
+import httpx
 import pytest
+from pathlib import Path
 from fastapi.testclient import TestClient
-from unittest.mock import patch, Mock
+from unittest.mock import Mock
+
+
+@pytest.fixture(autouse=True)
+def reset_mock_rag(test_app_without_static):
+    """Clear calls and side effects on the shared mock RAG system between tests"""
+    test_app_without_static.state.rag.reset_mock(
+        return_value=False, side_effect=True
+    )
 
 
 @pytest.mark.api
@@ -65,14 +77,63 @@ class TestQueryEndpoint:
     
     def test_query_endpoint_exception_handling(self, test_client):
         """Test query endpoint exception handling"""
-        with patch('conftest.Mock.query') as mock_query:
-            mock_query.side_effect = Exception("Test error")
-            
-            query_request = {"query": "What is Python?"}
+        test_client.app.state.rag.query.side_effect = Exception("Test error")
+        
+        query_request = {"query": "What is Python?"}
+        response = test_client.post("/api/query", json=query_request)
+        
+        assert response.status_code == 500
+        assert response.json()["detail"] == "internal_error"
+    
+    def test_query_endpoint_rate_limit_handling(self, test_client):
+        """Test that upstream rate limiting is returned as 429"""
+        upstream_response = httpx.Response(
+            429, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        )
+        test_client.app.state.rag.query.side_effect = anthropic.RateLimitError(
+            "Rate limited", response=upstream_response, body=None
+        )
+        
+        query_request = {"query": "What is Python?"}
+        response = test_client.post("/api/query", json=query_request)
+        
+        assert response.status_code == 429
+        assert response.json()["detail"] == "rate_limited"
+    
+    def test_query_endpoint_upstream_status_error_handling(self, test_client, caplog):
+        """Test that other upstream status errors return 502 and are logged"""
+        upstream_response = httpx.Response(
+            401,
+            headers={"request-id": "req_123"},
+            request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"),
+        )
+        test_client.app.state.rag.query.side_effect = anthropic.AuthenticationError(
+            "Invalid API key", response=upstream_response, body=None
+        )
+        
+        query_request = {"query": "What is Python?"}
+        with caplog.at_level("WARNING", logger="api_errors"):
+            response = test_client.post("/api/query", json=query_request)
+        
+        assert response.status_code == 502
+        assert response.json()["detail"] == "upstream_error"
+        assert "AuthenticationError" in caplog.text
+        assert "status 401" in caplog.text
+        assert "req_123" in caplog.text
+    
+    def test_query_endpoint_connection_error_handling(self, test_client, caplog):
+        """Test that an unreachable upstream returns 502 and is logged"""
+        test_client.app.state.rag.query.side_effect = anthropic.APIConnectionError(
+            request=httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        )
+        
+        query_request = {"query": "What is Python?"}
+        with caplog.at_level("WARNING", logger="api_errors"):
             response = test_client.post("/api/query", json=query_request)
-            
-            assert response.status_code == 500
-            assert "Test error" in response.json()["detail"]
+        
+        assert response.status_code == 502
+        assert response.json()["detail"] == "upstream_unreachable"
+        assert "APIConnectionError" in caplog.text
     
     def test_query_response_structure(self, test_client, sample_query_request):
         """Test that query response has correct structure"""
@@ -143,13 +204,13 @@ class TestCoursesEndpoint:
     
     def test_courses_endpoint_exception_handling(self, test_client):
         """Test courses endpoint exception handling"""
-        with patch('conftest.Mock.get_course_analytics') as mock_analytics:
-            mock_analytics.side_effect = Exception("Analytics error")
-            
-            response = test_client.get("/api/courses")
-            
-            assert response.status_code == 500
-            assert "Analytics error" in response.json()["detail"]
+        mock_rag = test_client.app.state.rag
+        mock_rag.get_course_analytics.side_effect = Exception("Analytics error")
+        
+        response = test_client.get("/api/courses")
+        
+        assert response.status_code == 500
+        assert "Analytics error" in response.json()["detail"]
     
     def test_courses_endpoint_methods(self, test_client):
         """Test that courses endpoint only accepts GET requests"""
@@ -252,19 +313,20 @@ class TestAPIValidation:
 class TestAPIIntegration:
     """Integration tests for API endpoints"""
     
-    def test_query_to_courses_workflow(self, test_client):
+    @pytest.mark.asyncio
+    async def test_query_to_courses_workflow(self, async_test_client):
         """Test workflow from query to getting course stats"""
-        # First, make a query
+        # The query and course stats requests are independent, so issue both at once
         query_request = {"query": "What is Python?"}
-        query_response = test_client.post("/api/query", json=query_request)
+        query_response, courses_response = await asyncio.gather(
+            async_test_client.post("/api/query", json=query_request),
+            async_test_client.get("/api/courses"),
+        )
         
         assert query_response.status_code == 200
         query_data = query_response.json()
         assert "session_id" in query_data
         
-        # Then get course stats
-        courses_response = test_client.get("/api/courses")
-        
         assert courses_response.status_code == 200
         courses_data = courses_response.json()
         assert courses_data["total_courses"] >= 0
@@ -288,4 +350,191 @@ class TestAPIIntegration:
         
         assert response2.status_code == 200
         data2 = response2.json()
-        assert data2["session_id"] == session_id
\ No newline at end of file
+        assert data2["session_id"] == session_id
+
+
+@pytest.mark.api
+class TestClaudeMode:
+    """Test simple_app answering queries directly with Claude"""
+    
+    def test_query_sends_last_three_exchanges(self, claude_test_client, mock_claude_create):
+        """Test that each query sends only the last 3 exchanges of history"""
+        for i in range(5):
+            response = claude_test_client.post(
+                "/api/query", json={"query": f"Question {i}", "session_id": "history"}
+            )
+            assert response.status_code == 200
+            assert response.json()["answer"] == f"Answer to: Question {i}"
+        
+        messages = mock_claude_create.await_args.kwargs["messages"]
+        expected = []
+        for i in range(1, 4):
+            expected.append({"role": "user", "content": f"Question {i}"})
+            expected.append({"role": "assistant", "content": f"Answer to: Question {i}"})
+        expected.append({"role": "user", "content": "Question 4"})
+        assert messages == expected
+    
+    def test_least_recently_used_session_is_evicted(
+        self, claude_test_client, mock_claude_create, monkeypatch
+    ):
+        """Test that the session store evicts the least recently used session"""
+        import simple_app
+        
+        monkeypatch.setattr(simple_app, "MAX_SESSIONS", 2)
+        
+        for session_id in ["a", "b", "a", "c"]:
+            response = claude_test_client.post(
+                "/api/query", json={"query": "Hello", "session_id": session_id}
+            )
+            assert response.status_code == 200
+        
+        assert list(simple_app.sessions) == ["a", "c"]
+
+
+@pytest.mark.api
+class TestResponseCache:
+    """Test caching of Claude answers in simple_app"""
+    
+    def test_identical_context_hits_cache(self, claude_test_client, mock_claude_create):
+        """Test that the same first-turn query in another session skips Claude"""
+        query = {"query": "What is Python?"}
+        response1 = claude_test_client.post("/api/query", json={**query, "session_id": "s1"})
+        response2 = claude_test_client.post("/api/query", json={**query, "session_id": "s2"})
+        
+        assert response1.json()["answer"] == response2.json()["answer"]
+        assert mock_claude_create.await_count == 1
+    
+    def test_different_history_misses_cache(self, claude_test_client, mock_claude_create):
+        """Test that repeating a query after an answer calls Claude again"""
+        query = {"query": "What is Python?", "session_id": "s1"}
+        claude_test_client.post("/api/query", json=query)
+        claude_test_client.post("/api/query", json=query)
+        
+        assert mock_claude_create.await_count == 2
+    
+    def test_cache_hit_records_exchange_in_session(
+        self, claude_test_client, mock_claude_create
+    ):
+        """Test that an answer served from the cache is still added to history"""
+        import simple_app
+        
+        query = {"query": "What is Python?"}
+        claude_test_client.post("/api/query", json={**query, "session_id": "s1"})
+        claude_test_client.post("/api/query", json={**query, "session_id": "s2"})
+        
+        assert mock_claude_create.await_count == 1
+        assert list(simple_app.sessions["s2"]) == [
+            {"role": "user", "content": "What is Python?"},
+            {"role": "assistant", "content": "Answer to: What is Python?"},
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_share_one_call(self, mock_claude_create):
+        """Test that a double-submitted query makes a single Claude call"""
+        from simple_app import create_app
+        
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.01)
+            return Mock(content=[Mock(text="Shared answer")])
+        
+        mock_claude_create.side_effect = slow_create
+        transport = httpx.ASGITransport(app=create_app(mount_static=False))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            query = {"query": "What is Python?", "session_id": "double-submit"}
+            responses = await asyncio.gather(
+                client.post("/api/query", json=query),
+                client.post("/api/query", json=query),
+            )
+        
+        assert [r.status_code for r in responses] == [200, 200]
+        assert [r.json()["answer"] for r in responses] == ["Shared answer"] * 2
+        assert mock_claude_create.await_count == 1
+
+
+@pytest.mark.api
+class TestFrontendStatic:
+    """Test serving the frontend from memory"""
+    
+    def test_root_serves_index(self, static_test_client):
+        """Test that / returns index.html"""
+        response = static_test_client.get("/")
+        
+        assert response.status_code == 200
+        assert "text/html" in response.headers["content-type"]
+        assert "Course Materials" in response.text
+        assert "ETag" in response.headers
+    
+    def test_nested_asset(self, static_test_client):
+        """Test that assets in subdirectories are served with their media type"""
+        response = static_test_client.get("/assets/app.js")
+        
+        assert response.status_code == 200
+        assert "javascript" in response.headers["content-type"]
+        assert response.text == "console.log('ready');"
+    
+    def test_unknown_path_returns_404(self, static_test_client):
+        """Test that paths not in the frontend return 404"""
+        response = static_test_client.get("/missing.js")
+        
+        assert response.status_code == 404
+    
+    def test_if_none_match_returns_304(self, static_test_client):
+        """Test that a matching ETag returns 304 without a body"""
+        etag = static_test_client.get("/assets/app.js").headers["ETag"]
+        
+        response = static_test_client.get(
+            "/assets/app.js", headers={"If-None-Match": etag}
+        )
+        
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+    
+    def test_head_request(self, static_test_client):
+        """Test that HEAD returns headers without a body"""
+        response = static_test_client.head("/")
+        
+        assert response.status_code == 200
+        assert "text/html" in response.headers["content-type"]
+        assert response.content == b""
+    
+    def test_missing_frontend_directory_raises(self, temp_dir, monkeypatch):
+        """Test that a missing frontend directory fails at app creation"""
+        import simple_app
+        
+        monkeypatch.setattr(simple_app, "FRONTEND_DIR", Path(temp_dir) / "missing")
+        
+        with pytest.raises(RuntimeError):
+            simple_app.create_app()
+    
+    def test_dev_mode_serves_edits_without_caching(self, frontend_dir, monkeypatch):
+        """Test that DEV mode reads files from disk and disables caching"""
+        import simple_app
+        
+        monkeypatch.setattr(simple_app, "FRONTEND_DIR", frontend_dir)
+        monkeypatch.setattr(simple_app, "DEV", True)
+        client = TestClient(simple_app.create_app(rag=Mock()))
+        
+        response = client.get("/")
+        assert response.status_code == 200
+        assert "no-cache" in response.headers["cache-control"]
+        
+        (frontend_dir / "index.html").write_text("<html>edited</html>")
+        
+        response = client.get("/")
+        assert response.text == "<html>edited</html>"
+        assert "no-cache" in response.headers["cache-control"]
+
+
+@pytest.mark.api
+class TestAppFactory:
+    """Test apps built with simple_app.create_app"""
+    
+    def test_factory_app_shutdown_keeps_shared_http_client_open(self):
+        """Test that shutting down a factory-built app leaves the module app usable"""
+        import simple_app
+        
+        with TestClient(simple_app.create_app(rag=Mock(), mount_static=False)):
+            pass
+        
+        assert not simple_app.http_client.is_closed